@@ -68,16 +68,38 @@ async def register_to_gateway():
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    global _client
     await register_to_gateway()
-    yield
+    try:
+        yield
+    finally:
+        if _client is not None:
+            await _client.aclose()
+            _client = None
 
 app = FastAPI(lifespan=lifespan)
 
 # 固定配置（你的 ESB 文件服务器地址）
 SERVER_BASE_URL = "http://fserver.sit.cqrcb.com:21014"
 TIMEOUT = 60  # seconds
+STREAM_CHUNK_SIZE = 256 * 1024  # 下载流式转发/落盘的分块大小
+UPLOAD_CHUNK_SIZE = 1 << 20  # 上传时按块读取本地文件，内存占用与文件大小无关
 APPSOURCE = "CQRCB_ESBFILE_SOURCE"
 
+_client: httpx.AsyncClient | None = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """进程内共享的文件服务器 client（懒创建），复用连接，省去每个请求的 TCP/TLS 握手。"""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            http2=True,
+            timeout=TIMEOUT,
+            limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+        )
+    return _client
+
 
 # ----------------------------------------------------
 #  ESB DOWNLOAD (下载到 Docker 本地)
@@ -99,12 +121,11 @@ async def esb_download(req: DownloadReq):
 
     async def _stream() -> AsyncIterator[bytes]:
         try:
-            async with httpx.AsyncClient(timeout=TIMEOUT) as client:
-                async with client.stream("GET", url) as resp:
-                    resp.raise_for_status()
-                    async for chunk in resp.aiter_bytes():
-                        if chunk:
-                            yield chunk
+            async with get_client().stream("GET", url) as resp:
+                resp.raise_for_status()
+                async for chunk in resp.aiter_bytes(chunk_size=STREAM_CHUNK_SIZE):
+                    if chunk:
+                        yield chunk
         except Exception as e:
             logger.error({"event": "esb.download.failed", "url": url, "error": str(e)})
             # 触发 FastAPI 重新抛出异常，返回 502
@@ -114,9 +135,15 @@ async def esb_download(req: DownloadReq):
     if local_file_path:
         try:
             os.makedirs(os.path.dirname(local_file_path) or ".", exist_ok=True)
-            with open(local_file_path, "wb") as f:
+            # 分块已足够大，直接 os.write，不再经过 BufferedWriter 的二次缓冲
+            fd = os.open(local_file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            try:
                 async for chunk in _stream():
-                    f.write(chunk)
+                    view = memoryview(chunk)
+                    while view:
+                        view = view[os.write(fd, view):]
+            finally:
+                os.close(fd)
         except Exception as e:
             logger.error(
                 {
@@ -137,6 +164,44 @@ async def esb_download(req: DownloadReq):
 # ----------------------------------------------------
 #  ESB UPLOAD（从 Docker 本地读取文件 → 上传）
 # ----------------------------------------------------
+# multipart 头尾模板只在导入时编码一次，每次上传只做一次 bytes 格式化
+_MULTIPART_PREFIX_TMPL = (
+    b"--%b\r\n"
+    b'Content-Disposition: form-data; name="file"; filename="%b"\r\n'
+    b"Content-Type: application/octet-stream\r\n\r\n"
+)
+_MULTIPART_SUFFIX_TMPL = b"\r\n--%b--\r\n"
+# 与 httpx 的 _HTML5_FORM_ENCODING_REPLACEMENTS 一致：引号、反斜杠转义，C0 控制字符（ESC 除外）百分号编码
+_FILENAME_ESCAPES = str.maketrans({
+    '"': "%22",
+    "\\": "\\\\",
+    **{chr(c): f"%{c:02X}" for c in range(0x20) if c != 0x1B},
+})
+
+
+def _multipart_envelope(server_file: str) -> tuple[str, bytes, bytes]:
+    """构造单文件 multipart 的边界、文件前的头部与结尾，文件内容夹在两者之间流式发送。"""
+    boundary = os.urandom(16).hex().encode("ascii")
+    filename = server_file.translate(_FILENAME_ESCAPES).encode("utf-8")
+    prefix = _MULTIPART_PREFIX_TMPL % (boundary, filename)
+    suffix = _MULTIPART_SUFFIX_TMPL % boundary
+    return boundary.decode("ascii"), prefix, suffix
+
+
+async def _multipart_stream(prefix: bytes, path: str, size: int, suffix: bytes) -> AsyncIterator[bytes]:
+    yield prefix
+    remaining = size
+    with open(path, "rb", buffering=0) as f:
+        # 只发送 Content-Length 里声明的 size 字节；文件读取放到线程池，避免大文件阻塞事件循环
+        while remaining:
+            chunk = await asyncio.to_thread(f.read, min(UPLOAD_CHUNK_SIZE, remaining))
+            if not chunk:
+                raise OSError(f"file truncated during upload: {path}")
+            remaining -= len(chunk)
+            yield chunk
+    yield suffix
+
+
 @app.post("/esb-upload")
 async def esb_upload(req: UploadReq):
     server_path = req.server_path
@@ -159,10 +224,9 @@ async def esb_upload(req: UploadReq):
         logger.warning({"event": "esb.upload.missing_local", "local_file_path": local_file_path})
         return JSONResponse(content=False)
 
-    # 读取本地文件
+    # 只取文件大小，内容在上传时按块流式读取，不整体读入内存
     try:
-        with open(local_file_path, "rb") as f:
-            file_bytes = f.read()
+        file_size = os.path.getsize(local_file_path)
     except Exception as e:
         logger.error({"event": "esb.upload.read_failed", "local_file_path": local_file_path, "error": str(e)})
         return JSONResponse(content=False)
@@ -171,14 +235,18 @@ async def esb_upload(req: UploadReq):
     server_path = server_path.rstrip("/")
     url = f"{server_path}/upload"
 
-    files = {
-        "file": (server_file, file_bytes, "application/octet-stream")
+    boundary, prefix, suffix = _multipart_envelope(server_file)
+    headers = {
+        "Content-Type": f"multipart/form-data; boundary={boundary}",
+        # 显式给出长度，避免 httpx 对生成器退回 chunked 编码
+        "Content-Length": str(len(prefix) + file_size + len(suffix)),
     }
 
     try:
-        async with httpx.AsyncClient(timeout=20) as client:
-            resp = await client.post(url, files=files)
-            resp.raise_for_status()
+        resp = await get_client().post(
+            url, content=_multipart_stream(prefix, local_file_path, file_size, suffix), headers=headers, timeout=20
+        )
+        resp.raise_for_status()
     except Exception as e:
         logger.error({"event": "esb.upload.failed", "url": url, "error": str(e)})
         return JSONResponse(content=False)
@@ -5,6 +5,10 @@ class Settings(BaseSettings):
     API_PREFIX: str = "/api"
     GW_API_KEY: str | None = None  # 开发期可留空
     REQUEST_TIMEOUT_SEC: float = 15.0
+    HTTPX_MAX_CONNECTIONS: int = 200   # 上游共享连接池
+    HTTPX_MAX_KEEPALIVE: int = 50
+    HTTPX_KEEPALIVE_EXPIRY: float = 30.0
+    HTTPX_HTTP2: bool = True           # TLS 上游经 ALPN 协商 h2，多路复用同一连接
     RETRIES: int = 1               # MVP 先 1 次重试
     ENABLE_METRICS: bool = True
     ENABLE_RATE_LIMIT: bool = False
@@ -3,6 +3,15 @@ import redis
 from .config import Settings, settings as app_settings
 
 
+def _index_route(routes: dict[str, dict[str, str]], key: str, value: str) -> None:
+    # category/action 都可能带点："ocr.v2.run" 既可能是 (ocr, v2.run) 也可能是 (ocr.v2, run)，
+    # 每种切分都登记一次，与原先按整 key "{category}.{action}" 查找的语义等价
+    dot = key.find(".")
+    while dot != -1:
+        routes.setdefault(key[:dot], {})[key[dot + 1:]] = value
+        dot = key.find(".", dot + 1)
+
+
 class RouteTable:
     def __init__(self, settings: Settings | None = None):
         self.settings = settings or app_settings
@@ -15,27 +24,37 @@ class RouteTable:
             password=self.settings.REDIS_PASSWORD,
             decode_responses=True,
         )
-        self._routes = {}
+        # 两级字典 {category: {action: url}}：resolve 时无需拼接 key 字符串
+        self._routes: dict[str, dict[str, str]] = {}
+        # 原样的 {key: url}：不带点的 key 也能保留，供 get()/all() 使用
+        self._flat: dict[str, str] = {}
         self.reload()   # 启动时加载一次
 
     # ------------------------------------------------------------------
     # 🔄 reload(): 从 Redis 同步整个路由表
     # ------------------------------------------------------------------
     def reload(self):
-        self._routes = self.r.hgetall(self.redis_key) or {}
+        flat = self.r.hgetall(self.redis_key) or {}
+        routes: dict[str, dict[str, str]] = {}
+        for key, value in flat.items():
+            _index_route(routes, key, value)
+        self._routes = routes
+        self._flat = flat
 
     # ------------------------------------------------------------------
     # 🔍 resolve(): 根据 category + action 得到 URL
     # ------------------------------------------------------------------
     def resolve(self, category: str, action: str) -> str | None:
-        return self._routes.get(f"{category}.{action}")
+        actions = self._routes.get(category)
+        return actions.get(action) if actions else None
 
     # ------------------------------------------------------------------
     # ⬅️ __setitem__(): 支持 route_table["tools.add"] = url
     # （用于自动注册 / register API）
     # ------------------------------------------------------------------
     def __setitem__(self, key: str, value: str):
-        self._routes[key] = value
+        _index_route(self._routes, key, value)
+        self._flat[key] = value
         self.r.hset(self.redis_key, key, value)
 
     # ------------------------------------------------------------------
@@ -48,10 +67,10 @@ class RouteTable:
     # 🔎 get(): 用于调试，获取单个 key
     # ------------------------------------------------------------------
     def get(self, key: str) -> str | None:
-        return self._routes.get(key)
+        return self._flat.get(key)
 
     # ------------------------------------------------------------------
     # 📋 all(): 列出所有可用路由
     # ------------------------------------------------------------------
     def all(self) -> dict:
-        return dict(self._routes)
+        return dict(self._flat)
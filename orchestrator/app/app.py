@@ -2,12 +2,18 @@ from __future__ import annotations
 
 from contextlib import asynccontextmanager
 import logging
+
+import httpx
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 
 from .health import router as health_router
 from .redis_client import create_redis_client
-from .logging_utils import setup_logging
+from .route_table import RouteTable
+from .logging_utils import setup_logging, TraceIdMiddleware
 from .config import settings
+from .services.agent_client import AgentClient, build_doc_ocr_runner
+from .services.job_tracker import JobTracker
 
 from .routers.document_ocr import router as doc_ocr_router
 from .routers.agent_gateway import router as agent_gateway_router
@@ -31,9 +37,37 @@ async def lifespan(app: FastAPI):
     logger.info({"event": "redis.ping.ok"})
 
     app.state.redis = r
+    # 路由表单例：进程内 TTL 缓存需要跨请求存活
+    app.state.route_table = RouteTable(r, settings.REDIS_KEY_PREFIX, cache_ttl=settings.ROUTE_CACHE_TTL_SEC)
+    # JobTracker 单例：Lua 脚本只注册一次，各请求共用
+    app.state.job_tracker = JobTracker(r)
+
+    # 全局共享的 httpx client：所有上游调用（agent 转发 / ESB / 智能体平台）复用同一个连接池，
+    # 避免每个请求重新建立 TCP/TLS 连接
+    http_client = httpx.AsyncClient(
+        timeout=settings.REQUEST_TIMEOUT_SEC,
+        limits=httpx.Limits(
+            max_connections=settings.HTTPX_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTPX_MAX_KEEPALIVE,
+            keepalive_expiry=settings.HTTPX_KEEPALIVE_EXPIRY,
+        ),
+        http2=settings.HTTPX_HTTP2,
+        follow_redirects=True,
+    )
+    app.state.http_client = http_client
+
+    app.state.agent_client = AgentClient(
+        base_url=settings.AGENT_BASE_URL,
+        timeout=settings.AGENT_TIMEOUT_SEC,
+        client=http_client,
+    )
+    app.state.doc_ocr_runner = build_doc_ocr_runner(app.state.agent_client)
     try:
         yield
     finally:
+        # 共享 client 由这里关闭；agent_client.aclose() 只关它自建的 client（注入时为空操作）
+        await app.state.agent_client.aclose()
+        await http_client.aclose()
         # redis-py 没有显式 close 也可，但这里做得更干净
         try:
             r.close()
@@ -46,8 +80,12 @@ def create_app() -> FastAPI:
         title="AI Component Hub - Orchestrator",
         version="0.1.0",
         lifespan=lifespan,
+        default_response_class=ORJSONResponse,
     )
 
+    # 每个请求只解析一次 X-Trace-Id，后续日志/转发统一从 contextvar 读取
+    app.add_middleware(TraceIdMiddleware)
+
     app.include_router(health_router, tags=["health"])
     app.include_router(agent_gateway_router, tags=["agents"])
 
@@ -1,37 +1,61 @@
 from __future__ import annotations
 
-import os
+from pydantic import field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
+    # 字段默认值即缺省配置，环境变量由 pydantic-settings 统一读取/解析（大小写不敏感）
     model_config = SettingsConfigDict(env_prefix="", extra="ignore")
 
     # Redis
-    REDIS_HOST: str = os.getenv("REDIS_HOST", "redis")
-    REDIS_PORT: int = int(os.getenv("REDIS_PORT", "6379"))
-    REDIS_DB: int = int(os.getenv("REDIS_DB", "0"))
-    REDIS_PASSWORD: str | None = os.getenv("REDIS_PASSWORD") or None
+    REDIS_HOST: str = "redis"
+    REDIS_PORT: int = 6379
+    REDIS_DB: int = 0
+    REDIS_PASSWORD: str | None = None
 
     # Namespace（避免不同系统/环境 key 冲突）
-    REDIS_KEY_PREFIX: str = os.getenv("REDIS_KEY_PREFIX", "aihub:orchestrator")
+    REDIS_KEY_PREFIX: str = "aihub:orchestrator"
 
     # 任务/幂等相关默认 TTL（秒）
-    IDEMPOTENCY_TTL_SEC: int = int(os.getenv("IDEMPOTENCY_TTL_SEC", "3600"))  # 1h
-    JOB_TTL_SEC: int = int(os.getenv("JOB_TTL_SEC", "86400"))  # 24h
+    IDEMPOTENCY_TTL_SEC: int = 3600  # 1h
+    JOB_TTL_SEC: int = 86400  # 24h
+    # job 序列化后超过该字节数时以 zstd 压缩写入 Redis
+    JOB_COMPRESS_MIN_BYTES: int = 4096
 
     # staging 目录（必须挂载外部卷）
-    STAGING_DIR: str = os.getenv("STAGING_DIR", "/app/data/staging")
+    STAGING_DIR: str = "/app/data/staging"
 
     # ESB service base URL（同 docker-compose 内服务名）
-    ESB_BASE_URL: str = os.getenv("ESB_BASE_URL", "http://esb:7002")
+    ESB_BASE_URL: str = "http://esb:7002"
+
+    # 结果 JSON 页数或（顶层字符串粗估的）字节数超过阈值时，序列化/落盘放到线程池执行
+    JSON_OFFLOAD_MIN_PAGES: int = 50
+    JSON_OFFLOAD_MIN_BYTES: int = 256 * 1024
 
     # Logging
-    LOG_DIR: str = os.getenv("LOG_DIR", "/app/data/logs")
-    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
-    LOG_RETENTION_DAYS: int = int(os.getenv("LOG_RETENTION_DAYS", "10"))
+    LOG_DIR: str = "/app/data/logs"
+    LOG_LEVEL: str = "INFO"
+    LOG_RETENTION_DAYS: int = 10
 
     # Agent proxy
-    REQUEST_TIMEOUT_SEC: float = float(os.getenv("REQUEST_TIMEOUT_SEC", "15.0"))
+    REQUEST_TIMEOUT_SEC: float = 15.0
+    ROUTE_CACHE_TTL_SEC: float = 5.0  # 进程内路由缓存；0 表示每次都查 Redis
+
+    # 共享 httpx 连接池（默认值远大于 httpx 的 10 keep-alive / 5s，避免突发流量下连接被频繁回收）
+    HTTPX_MAX_CONNECTIONS: int = 200
+    HTTPX_MAX_KEEPALIVE: int = 50
+    HTTPX_KEEPALIVE_EXPIRY: float = 30.0
+    HTTPX_HTTP2: bool = True
+
+    # 智能体平台（为空时走 stub）
+    AGENT_BASE_URL: str = ""
+    AGENT_TIMEOUT_SEC: float = 120.0
+
+    @field_validator("REDIS_PASSWORD")
+    @classmethod
+    def _empty_password_as_none(cls, v: str | None) -> str | None:
+        # 与原先 `os.getenv(...) or None` 保持一致：空字符串视为未设置
+        return v or None
 
 
 settings = Settings()
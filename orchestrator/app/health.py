@@ -1,16 +1,33 @@
 from __future__ import annotations
 
+import time
+
 from fastapi import APIRouter, Request
+from fastapi.responses import ORJSONResponse
+from starlette.concurrency import run_in_threadpool
+
+router = APIRouter(default_response_class=ORJSONResponse)
+
+# 探针（LB / k8s）高频访问时，1 秒内复用上一次 Redis ping 结果
+_PING_CACHE_TTL_SEC = 1.0
+_last_check: tuple[float, bool] = (float("-inf"), False)
 
-router = APIRouter()
 
 @router.get("/health")
-def health(request: Request):
-    r = request.app.state.redis
-    try:
-        r.ping()
-        redis_ok = True
-    except Exception:
-        redis_ok = False
-
-    return {"status": "ok", "service": "orchestrator", "redis": redis_ok}
+async def health(request: Request):
+    global _last_check
+
+    now = time.monotonic()
+    checked_at, redis_ok = _last_check
+    if now - checked_at >= _PING_CACHE_TTL_SEC:
+        r = request.app.state.redis
+        try:
+            # redis 是同步 client，放到线程池里避免阻塞事件循环
+            await run_in_threadpool(r.ping)
+            redis_ok = True
+        except Exception:
+            redis_ok = False
+        _last_check = (now, redis_ok)
+
+    body = {"status": "ok" if redis_ok else "degraded", "service": "orchestrator", "redis": redis_ok}
+    return ORJSONResponse(body, status_code=200 if redis_ok else 503)
@@ -2,10 +2,37 @@ import json
 import logging
 import os
 import sys
+from contextvars import ContextVar
 from datetime import datetime, timezone
 from logging.handlers import TimedRotatingFileHandler
 
 
+# 当前请求的 X-Trace-Id，由中间件在请求入口设置一次
+trace_id_var: ContextVar[str] = ContextVar("trace_id", default="")
+
+
+class TraceIdFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.trace_id = trace_id_var.get() or None
+        return True
+
+
+class TraceIdMiddleware:
+    # 纯 ASGI 中间件：直接扫描 scope["headers"]，不经过 BaseHTTPMiddleware 的请求包装与流式 body 转发
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            trace_id = ""
+            for name, value in scope["headers"]:
+                if name == b"x-trace-id":
+                    trace_id = value.decode("latin-1")
+                    break
+            trace_id_var.set(trace_id)
+        await self.app(scope, receive, send)
+
+
 class JsonFormatter(logging.Formatter):
     def __init__(self, service_name: str):
         super().__init__()
@@ -19,6 +46,9 @@ class JsonFormatter(logging.Formatter):
             "service": self.service_name,
             "logger": record.name,
         }
+        trace_id = getattr(record, "trace_id", None)
+        if trace_id:
+            base["trace_id"] = trace_id
         base.update(payload)
 
         if record.exc_info:
@@ -38,14 +68,17 @@ def setup_logging(service_name: str, log_dir: str, level: str, retention_days: i
 
     log_path = os.path.join(log_dir, f"{service_name}.log")
     formatter = JsonFormatter(service_name)
+    trace_filter = TraceIdFilter()
 
     file_handler = TimedRotatingFileHandler(
         log_path, when="D", interval=1, backupCount=retention_days, encoding="utf-8"
     )
     file_handler.setFormatter(formatter)
+    file_handler.addFilter(trace_filter)
 
     stream_handler = logging.StreamHandler(sys.stdout)
     stream_handler.setFormatter(formatter)
+    stream_handler.addFilter(trace_filter)
 
     root.addHandler(file_handler)
     root.addHandler(stream_handler)
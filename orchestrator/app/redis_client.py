@@ -14,7 +14,8 @@ def create_redis_client() -> Redis:
         port=settings.REDIS_PORT,
         db=settings.REDIS_DB,
         password=settings.REDIS_PASSWORD,
-        decode_responses=True,   # 统一用 str
+        # 返回原始 bytes：job JSON 直接交给 orjson 解析，省去一次 utf-8 解码；装了 hiredis 时由其解析 RESP
+        decode_responses=False,
         socket_connect_timeout=2,
         socket_timeout=5,
     )
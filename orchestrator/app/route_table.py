@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import time
 from typing import Awaitable, Protocol, TypeVar, cast
 
 
@@ -7,7 +8,7 @@ T = TypeVar("T")
 
 
 class SyncRedis(Protocol):
-    def hget(self, name: str, key: str) -> str | None | Awaitable[str | None]: ...
+    def hget(self, name: str, key: str) -> bytes | None | Awaitable[bytes | None]: ...
     def hset(self, name: str, key: str, value: str) -> int | Awaitable[int]: ...
     def hgetall(self, name: str) -> dict | Awaitable[dict]: ...
 
@@ -19,18 +20,38 @@ def _ensure_sync(value: T | Awaitable[T], op: str) -> T:
 
 
 class RouteTable:
-    def __init__(self, redis_client: SyncRedis, key_prefix: str):
+    def __init__(self, redis_client: SyncRedis, key_prefix: str, cache_ttl: float = 0.0):
         self.r = redis_client
         self.redis_key = f"{key_prefix}:routes"
+        # 进程内路由缓存 {key: (url, 过期时间 monotonic)}；不做跨进程一致性，陈旧窗口受 TTL 约束
+        self.cache_ttl = cache_ttl
+        self._cache: dict[str, tuple[str, float]] = {}
 
     def resolve(self, category: str, action: str) -> str | None:
-        value = self.r.hget(self.redis_key, f"{category}.{action}")
-        return _ensure_sync(value, "hget")
+        key = f"{category}.{action}"
+        if self.cache_ttl > 0:
+            hit = self._cache.get(key)
+            if hit is not None and hit[1] > time.monotonic():
+                return hit[0]
+
+        raw = _ensure_sync(self.r.hget(self.redis_key, key), "hget")
+        if raw is None:
+            return None
+        # client 以 decode_responses=False 创建，这里自行解码
+        value = raw.decode() if isinstance(raw, bytes) else raw
+        # 只缓存命中：新注册的路由不会被负缓存挡住
+        if self.cache_ttl > 0:
+            self._cache[key] = (value, time.monotonic() + self.cache_ttl)
+        return value
 
     def add(self, key: str, value: str) -> None:
         result = self.r.hset(self.redis_key, key, value)
         _ensure_sync(result, "hset")
+        self._cache.pop(key, None)
 
     def all(self) -> dict:
-        value = self.r.hgetall(self.redis_key)
-        return _ensure_sync(value, "hgetall") or {}
+        value = _ensure_sync(self.r.hgetall(self.redis_key), "hgetall") or {}
+        return {
+            (k.decode() if isinstance(k, bytes) else k): (v.decode() if isinstance(v, bytes) else v)
+            for k, v in value.items()
+        }
@@ -1,25 +1,52 @@
 from __future__ import annotations
 
-import json
 import logging
+import re
+from typing import AsyncIterator
 
 import httpx
+import orjson
 from fastapi import APIRouter, HTTPException, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
 
-from ..config import settings
-from ..redis_client import get_redis
-from ..route_table import RouteTable
-from ..schemas.route_schemas import RouteEntry, StdResp
+from ..schemas.route_schemas import RouteEntry
 
 
-router = APIRouter()
+router = APIRouter(default_response_class=ORJSONResponse)
 logger = logging.getLogger("orchestrator")
 
+# 必须移除的 hop-by-hop 头，避免长度/连接语义错乱
+_HOP_BY_HOP_BYTES = frozenset(
+    (b"host", b"content-length", b"transfer-encoding", b"connection", b"expect", b"accept-encoding")
+)
+
+# 请求体是否以 JSON 对象/数组开头（match 只看开头，不复制、不解析整个 body）
+_JSON_START = re.compile(rb"\s*[\[{]")
+
+# 成功信封 {"code":0,"message":"ok","data":<上游原始 JSON>} 的固定前缀
+_OK_PREFIX = b'{"code":0,"message":"ok","data":'
+
+# 上游超时/不可达时的固定响应体，启动时序列化一次
+_TIMEOUT_BODY = orjson.dumps({"code": 504, "message": "upstream_timeout", "data": None})
+_BADGW_BODY = orjson.dumps({"code": 502, "message": "bad_gateway", "data": None})
+
+
+async def _stream_ok_envelope(resp: httpx.Response) -> AsyncIterator[bytes]:
+    """边收边发：前缀 + 上游 JSON 原始分块 + 结尾 '}'，内存占用与响应大小无关。"""
+    yield _OK_PREFIX
+    empty = True
+    # 用 aiter_bytes 而不是 aiter_raw：httpx 默认声明 Accept-Encoding: gzip，上游可能压缩
+    async for chunk in resp.aiter_bytes():
+        if chunk:
+            empty = False
+            yield chunk
+    yield b"null}" if empty else b"}"
+
 
 @router.post("/register")
 def register(ep: RouteEntry, request: Request):
-    table = RouteTable(get_redis(request.app), settings.REDIS_KEY_PREFIX)
+    table = request.app.state.route_table
     key = f"{ep.category}.{ep.action}"
     table.add(key, ep.url)
     logger.info({"event": "routes.register", "category": ep.category, "action": ep.action, "url": ep.url})
@@ -28,7 +55,7 @@ def register(ep: RouteEntry, request: Request):
 
 @router.api_route("/api/agents/{name}", methods=["GET", "POST"])
 async def proxy_agent(name: str, request: Request):
-    table = RouteTable(get_redis(request.app), settings.REDIS_KEY_PREFIX)
+    table = request.app.state.route_table
     target = table.resolve("agents", name)
     if not target:
         logger.warning(
@@ -36,66 +63,75 @@ async def proxy_agent(name: str, request: Request):
                 "event": "routes.miss",
                 "category": "agents",
                 "action": name,
-                "trace_id": request.headers.get("X-Trace-Id"),
                 "request_id": request.headers.get("X-Request-Id"),
             }
         )
         raise HTTPException(status_code=404, detail="agent_not_found")
 
     method = request.method
-    headers = dict(request.headers)
-    hop_by_hop = [
-        "host",
-        "content-length",
-        "transfer-encoding",
-        "connection",
-        "expect",
-        "accept-encoding",
-    ]
-    for h in hop_by_hop:
-        headers.pop(h, None)
-
-    headers.setdefault("X-Trace-Id", request.headers.get("X-Trace-Id", ""))
-    headers.setdefault("X-Request-Id", request.headers.get("X-Request-Id", ""))
+    # 直接遍历 ASGI 原始头（key 已是小写 bytes），按 httpx 接受的 (bytes, bytes) 列表构造出站头
+    headers: list[tuple[bytes, bytes]] = []
+    present: set[bytes] = set()
+    for k, v in request.headers.raw:
+        if k not in _HOP_BY_HOP_BYTES:
+            headers.append((k, v))
+            present.add(k)
+
+    # 透传 Trace-ID（调用方未带时补空值；中间件的 trace_id_var 取自同一请求头，此时也为空）
+    if b"x-trace-id" not in present:
+        headers.append((b"x-trace-id", b""))
+    if b"x-request-id" not in present:
+        headers.append((b"x-request-id", b""))
 
     params = dict(request.query_params)
     body = None
 
     if method == "POST":
-        raw_body = await request.body()
-        if raw_body:
+        # 请求体原样转发，不做完整解析；只在调用方没带 Content-Type 时看首个非空白字节补上 JSON 类型
+        body = await request.body() or None
+        if body and b"content-type" not in present and _JSON_START.match(body):
+            headers.append((b"content-type", b"application/json"))
+
+    client: httpx.AsyncClient = request.app.state.http_client
+    upstream_req = client.build_request(
+        method,
+        target,
+        params=params,
+        headers=headers,
+        content=body,
+    )
+    try:
+        resp = await client.send(upstream_req, stream=True)
+        stream_through = resp.status_code < 400 and resp.headers.get("content-type", "").startswith("application/json")
+        if not stream_through:
+            # 错误 / 非 JSON 响应体通常很小，读完后走统一包装
             try:
-                body = json.loads(raw_body.decode("utf-8"))
-            except Exception:
-                body = raw_body
-
-    timeout = httpx.Timeout(settings.REQUEST_TIMEOUT_SEC)
-    async with httpx.AsyncClient(timeout=timeout, follow_redirects=True) as client:
-        try:
-            resp = await client.request(
-                method,
-                target,
-                params=params,
-                headers=headers,
-                json=body if isinstance(body, dict) else None,
-                content=body if isinstance(body, (bytes, str)) else None,
-            )
-        except httpx.TimeoutException:
-            return JSONResponse(StdResp(code=504, message="upstream_timeout").model_dump(), status_code=504)
-        except httpx.RequestError as e:
-            logger.exception(e)
-            return JSONResponse(StdResp(code=502, message="bad_gateway").model_dump(), status_code=502)
+                await resp.aread()
+            finally:
+                await resp.aclose()
+    except httpx.TimeoutException:
+        return Response(_TIMEOUT_BODY, status_code=504, media_type="application/json")
+    except httpx.RequestError as e:
+        logger.exception(e)
+        return Response(_BADGW_BODY, status_code=502, media_type="application/json")
+
+    # 上游成功且返回 JSON：按字节拼接统一信封并流式转发，不解析也不整体缓冲
+    if stream_through:
+        return StreamingResponse(
+            _stream_ok_envelope(resp), media_type="application/json", background=BackgroundTask(resp.aclose)
+        )
 
     try:
-        data = resp.json()
+        data = orjson.loads(resp.content)
     except Exception:
         data = {"raw": resp.text}
 
-    return JSONResponse(
-        StdResp(
-            code=0 if resp.status_code < 400 else resp.status_code,
-            message="ok" if resp.status_code < 400 else "upstream_error",
-            data=data,
-        ).model_dump(),
-        status_code=200 if resp.status_code < 400 else 502,
+    ok = resp.status_code < 400
+    return ORJSONResponse(
+        {
+            "code": 0 if ok else resp.status_code,
+            "message": "ok" if ok else "upstream_error",
+            "data": data,
+        },
+        status_code=200 if ok else 502,
     )
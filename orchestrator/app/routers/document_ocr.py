@@ -1,10 +1,12 @@
 from __future__ import annotations
 
-import json
 import logging
 from pathlib import Path
 
-from fastapi import APIRouter, HTTPException, Request
+import httpx
+
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Request
+from fastapi.responses import ORJSONResponse
 
 from ..config import settings
 from ..services.file_stage import (
@@ -12,51 +14,89 @@ from ..services.file_stage import (
     split_url_for_esb,
     upload_json_via_esb,
 )
-from ..services.agent_client import AgentClient
 from ..services.job_tracker import JobTracker
 from ..schemas.document_ocr_schemas import DocOCRReq, DocOCRResp
 
 
-router = APIRouter()
+router = APIRouter(default_response_class=ORJSONResponse)
 logger = logging.getLogger("orchestrator")
 
 
+async def _upload_result_to_esb(
+    tracker: JobTracker,
+    client: httpx.AsyncClient,
+    *,
+    request_id: str,
+    server_path: str,
+    result: dict,
+) -> None:
+    upload_filename = f"{request_id}-result.json"
+    # 结果文件由 upload_json_via_esb 负责写入（大结果会放到线程池序列化）
+    upload_path = Path(settings.STAGING_DIR) / request_id / upload_filename
+
+    esb_upload = {"server_path": server_path, "server_file": upload_filename}
+    try:
+        await upload_json_via_esb(
+            server_path=server_path,
+            server_file=upload_filename,
+            payload=result["agent"],
+            local_file_path=str(upload_path),
+            client=client,
+        )
+    except Exception as e:
+        # 调用方已拿到 SUCCEEDED 与结果；上传失败只记在 esb_upload 上，保留结果，幂等重试仍能取回
+        esb_upload["error"] = f"upload_failed: {e}"
+        logger.error(
+            {
+                "event": "doc_ocr.upload_failed",
+                "request_id": request_id,
+                "error": str(e),
+            }
+        )
+    else:
+        logger.info({"event": "doc_ocr.uploaded", "request_id": request_id})
+
+    result["esb_upload"] = esb_upload
+    tracker.set_status(request_id, status="SUCCEEDED", result=result, error=None, ttl=settings.JOB_TTL_SEC)
+
+
 @router.post("/doc-ocr/run", response_model=DocOCRResp)
-async def run_doc_ocr(req: DocOCRReq, request: Request):
+async def run_doc_ocr(req: DocOCRReq, request: Request, background_tasks: BackgroundTasks):
     """
     最小可上线版本：
     - 生成/使用 request_id（幂等）
     - Redis 记录 job 状态与结果（无状态）
     - 下载文件到外部 volume staging（流式）
     - 调用智能体平台（先 stub）
+    - 结果上传 ESB 放到响应之后的后台任务
     """
-    r = request.app.state.redis  # type: ignore[attr-defined]
-    tracker = JobTracker(r)
+    tracker: JobTracker = request.app.state.job_tracker  # type: ignore[attr-defined]
 
     request_id = tracker.ensure_request_id(req.request_id)
-    trace_id = request.headers.get("X-Trace-Id")
-    logger.info({"event": "doc_ocr.received", "request_id": request_id, "trace_id": trace_id})
-
-    # 1) 幂等：如果已经有结果/状态，直接返回
-    _, existing = tracker.get_job(request_id)
+    logger.info({"event": "doc_ocr.received", "request_id": request_id})
+
+    # 1) 幂等 + 2) 分布式锁 + 3) 写入 RUNNING：一个 Lua 脚本、一次往返
+    #    调用方未传 request_id 时由服务端新生成，必然不存在，跳过幂等查询
+    token, existing = tracker.start_job(
+        request_id,
+        lock_ttl=settings.IDEMPOTENCY_TTL_SEC,
+        job_ttl=settings.JOB_TTL_SEC,
+        fresh=req.request_id is None,
+    )
     if existing:
+        # 已经有结果/状态，直接返回
         return DocOCRResp(
             request_id=request_id,
             status=existing.get("status", "UNKNOWN"),
             result=existing.get("result"),
             error=existing.get("error"),
         )
-
-    # 2) 分布式锁：避免同一 request_id 并发重复执行
-    token, _ = tracker.acquire_lock(request_id, ttl=settings.IDEMPOTENCY_TTL_SEC)
     if not token:
         # 有另一个实例在跑；返回 RUNNING（调用方可重试）
         return DocOCRResp(request_id=request_id, status="RUNNING")
 
     try:
-        # 3) 写入 RUNNING 状态（带 TTL）
-        tracker.set_status(request_id, status="RUNNING", result=None, error=None, ttl=settings.JOB_TTL_SEC)
-        logger.info({"event": "doc_ocr.running", "request_id": request_id, "trace_id": trace_id})
+        logger.info({"event": "doc_ocr.running", "request_id": request_id})
 
         # 4) 下载文件到 staging（外部卷路径）
         filename = req.file.filename or "input.bin"
@@ -66,32 +106,34 @@ async def run_doc_ocr(req: DocOCRReq, request: Request):
             staging_dir=settings.STAGING_DIR,
             filename=filename,
             timeout=120.0,
+            client=request.app.state.http_client,  # type: ignore[attr-defined]
         )
 
         # 5) 调用智能体平台（一期 stub）
         # TODO: 我们需要切换成AB智能体的调用方式(利用appid, private还有departmentid)
-        client = AgentClient(base_url="")  # 后续接真实平台时从 env/config 注入 base_url
-        agent_res = await client.run_doc_ocr(local_file_path=staged.local_path, options=req.options)
+        run_agent = request.app.state.doc_ocr_runner  # type: ignore[attr-defined]
+        agent_res = await run_agent(local_file_path=staged.local_path, options=req.options)
 
         if not agent_res.ok:
-            tracker.set_status(
+            tracker.complete(
                 request_id,
+                token,
                 status="FAILED",
                 result=None,
                 error=agent_res.error,
                 ttl=settings.JOB_TTL_SEC,
             )
+            token = None
             logger.error(
                 {
                     "event": "doc_ocr.failed",
                     "request_id": request_id,
-                    "trace_id": trace_id,
                     "error": agent_res.error,
                 }
             )
             raise HTTPException(status_code=502, detail=agent_res.error or "agent upstream error")
 
-        # 6) 写入 UPLOADING 状态（带 TTL）
+        # 6) 写入 SUCCEEDED 并释放锁；ESB 上传不在响应的关键路径上，交给后台任务
         result = {
             "staged": {
                 "url": staged.url,
@@ -101,48 +143,24 @@ async def run_doc_ocr(req: DocOCRReq, request: Request):
             },
             "agent": agent_res.data,
         }
-        tracker.set_status(request_id, status="UPLOADING", result=result, error=None, ttl=settings.JOB_TTL_SEC)
-        logger.info({"event": "doc_ocr.uploading", "request_id": request_id, "trace_id": trace_id})
+        tracker.complete(request_id, token, status="SUCCEEDED", result=result, error=None, ttl=settings.JOB_TTL_SEC)
+        token = None
+        logger.info({"event": "doc_ocr.succeeded", "request_id": request_id})
 
-        # 7) 上传智能体结果到文件服务器（通过 ESB）
+        # 7) 响应返回后再上传智能体结果到文件服务器（通过 ESB），完成后回写 job
         server_path, _ = split_url_for_esb(req.file.url)
-        upload_filename = f"{request_id}-result.json"
-        upload_path = Path(settings.STAGING_DIR) / request_id / upload_filename
-        upload_path.parent.mkdir(parents=True, exist_ok=True)
-        upload_path.write_text(json.dumps(agent_res.data, ensure_ascii=False), encoding="utf-8")
-
-        try:
-            await upload_json_via_esb(
-                server_path=server_path,
-                server_file=upload_filename,
-                payload=agent_res.data,
-                local_file_path=str(upload_path),
-            )
-        except Exception as e:
-            tracker.set_status(
-                request_id,
-                status="FAILED",
-                result=None,
-                error=f"upload_failed: {e}",
-                ttl=settings.JOB_TTL_SEC,
-            )
-            logger.error(
-                {
-                    "event": "doc_ocr.upload_failed",
-                    "request_id": request_id,
-                    "trace_id": trace_id,
-                    "error": str(e),
-                }
-            )
-            raise HTTPException(status_code=502, detail="upload_to_esb_failed")
+        background_tasks.add_task(
+            _upload_result_to_esb,
+            tracker,
+            request.app.state.http_client,  # type: ignore[attr-defined]
+            request_id=request_id,
+            server_path=server_path,
+            result=result,
+        )
 
-        result["esb_upload"] = {"server_path": server_path, "server_file": upload_filename}
-        tracker.set_status(request_id, status="SUCCEEDED", result=result, error=None, ttl=settings.JOB_TTL_SEC)
-        logger.info({"event": "doc_ocr.succeeded", "request_id": request_id, "trace_id": trace_id})
-        
-        
         return DocOCRResp(request_id=request_id, status="SUCCEEDED", result=result)
 
     finally:
-        # 7) 解锁
-        tracker.release_lock(request_id, token)
+        # 7) 解锁：终态写入时已随 complete() 一并释放，这里只兜底异常路径
+        if token:
+            tracker.release_lock(request_id, token)
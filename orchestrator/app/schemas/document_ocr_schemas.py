@@ -2,22 +2,29 @@ from __future__ import annotations
 
 from typing import Any, Dict, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
+from pydantic.dataclasses import dataclass
 
 
 class FileRef(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
     # 你们文件服务器是 HTTP 下载；这里用“完整URL”最简单
     url: str = Field(..., description="HTTP file url on file server")
     filename: Optional[str] = Field(None, description="Optional local filename for staging")
 
 
 class DocOCRReq(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
     request_id: Optional[str] = Field(None, description="Idempotency key. If absent, server will generate one.")
     file: FileRef
     options: Dict[str, Any] = Field(default_factory=dict)
 
 
-class DocOCRResp(BaseModel):
+# 响应只做数据承载：用 slots dataclass，省掉 BaseModel 的 __dict__ 开销
+@dataclass(slots=True)
+class DocOCRResp:
     request_id: str
     status: str
     result: Optional[Dict[str, Any]] = None
@@ -1,13 +1,13 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Awaitable, Callable, Dict, Optional
 
 import httpx
+import msgspec
 
-@dataclass
-class AgentResult:
+
+class AgentResult(msgspec.Struct):
     ok: bool
     data: Dict[str, Any]
     error: Optional[str] = None
@@ -17,10 +17,23 @@ class AgentClient:
     """
     调用后端智能体平台的 client。
     一期先 stub（返回假结果），后续对接真实平台时，只需要替换 run_doc_ocr() 的实现即可。
+    实例在启动时创建一次并复用；httpx.AsyncClient 通常由 app 注入（全局共享连接池）。
     """
 
-    def __init__(self, base_url: str = ""):
+    def __init__(self, base_url: str = "", *, timeout: float = 120.0, client: httpx.AsyncClient | None = None):
         self.base_url = base_url.rstrip("/")
+        # 平台地址在实例生命周期内不变，构造时拼好
+        self.doc_ocr_url = f"{self.base_url}/agents/doc-ocr/run"
+        self.timeout = timeout
+        self._owns_client = client is None
+        self.client = client or httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_keepalive_connections=100),
+        )
+
+    async def aclose(self) -> None:
+        if self._owns_client:
+            await self.client.aclose()
 
     async def run_doc_ocr(self, *, local_file_path: str, options: Dict[str, Any]) -> AgentResult:
         # -------------------------
@@ -49,14 +62,24 @@ class AgentClient:
         if not self.base_url:
             return AgentResult(ok=False, data={}, error="AGENT_BASE_URL is empty")
 
-        url = f"{self.base_url}/agents/doc-ocr/run"
-
         try:
-            async with httpx.AsyncClient(timeout=120.0) as client:
-                with open(local_file_path, "rb") as f:
-                    files = {"file": (Path(local_file_path).name, f, "application/octet-stream")}
-                    resp = await client.post(url, data={"options": str(options)}, files=files)
-                resp.raise_for_status()
-                return AgentResult(ok=True, data=resp.json())
+            with open(local_file_path, "rb") as f:
+                files = {"file": (Path(local_file_path).name, f, "application/octet-stream")}
+                resp = await self.client.post(
+                    self.doc_ocr_url, data={"options": str(options)}, files=files, timeout=self.timeout
+                )
+            resp.raise_for_status()
+            return AgentResult(ok=True, data=resp.json())
         except Exception as e:
             return AgentResult(ok=False, data={}, error=str(e))
+
+
+DocOCRRunner = Callable[..., Awaitable[AgentResult]]
+
+
+def build_doc_ocr_runner(client: AgentClient) -> DocOCRRunner:
+    """
+    启动时一次性决定 doc-ocr 走真实平台还是 stub（配置在运行期不变），
+    返回绑定好的方法，请求路径上不再做任何分支判断。
+    """
+    return client.run_doc_ocr_real if client.base_url else client.run_doc_ocr
@@ -1,18 +1,36 @@
 from __future__ import annotations
 
+import asyncio
 import hashlib
-import json
-from dataclasses import dataclass
+import os
+from contextlib import AsyncExitStack
+from functools import lru_cache
 from pathlib import Path
+from typing import Awaitable, Callable
 from urllib.parse import urlsplit
 
 import httpx
+import msgspec
+import orjson
 
 from ..config import settings
 
 
-@dataclass
-class StagedFile:
+# 1 MiB：与常见 OS 回写粒度一致，减少每块的 write/hash 调用次数
+_STAGE_CHUNK_SIZE = 1 << 20
+_IDENTITY_ENCODING = {"Accept-Encoding": "identity"}
+# 块已足够大，直接 os.write 落盘，不再经过 BufferedWriter 的二次缓冲
+_STAGE_OPEN_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_CLOEXEC
+# 收包与落盘之间最多缓冲的块数（× _STAGE_CHUNK_SIZE 即内存上限）
+_STAGE_QUEUE_DEPTH = 8
+
+# ESB 地址在进程生命周期内不变，导入时拼好，请求路径上不再重复 rstrip/拼接
+_ESB_BASE_URL = settings.ESB_BASE_URL.rstrip("/")
+_ESB_DOWNLOAD_URL = _ESB_BASE_URL + "/esb-download"
+_ESB_UPLOAD_URL = _ESB_BASE_URL + "/esb-upload"
+
+
+class StagedFile(msgspec.Struct, frozen=True):
     request_id: str
     url: str
     local_path: str
@@ -27,22 +45,22 @@ async def download_to_staging(
     staging_dir: str,
     filename: str = "input.bin",
     timeout: float | None = 60.0,
+    client: httpx.AsyncClient | None = None,
+    on_chunk: Callable[[bytes], Awaitable[None]] | None = None,
 ) -> StagedFile:
     """
     从 HTTP 文件服务器下载到 staging 目录（外部 volume 挂载路径）。
     - 采用流式下载，避免大文件读入内存
     - 计算 sha256 便于审计/排障
+    - 传入 client 时复用其连接池；否则临时创建一个
+    - on_chunk：每个分块收到后回调，便于调用方边下边转发，无需再读一遍文件
     """
-    base = Path(staging_dir) / request_id
-    base.mkdir(parents=True, exist_ok=True)
+    base = os.path.join(staging_dir, request_id)
+    os.makedirs(base, exist_ok=True)
 
-    dst = base / filename
-
-    size = 0
-    h = hashlib.sha256()
+    dst = os.path.join(base, filename)
 
     server_path, server_file = split_url_for_esb(url)
-    esb_endpoint = settings.ESB_BASE_URL.rstrip("/") + "/esb-download"
     payload = {
         "server_path": server_path,
         "server_file": server_file,
@@ -50,27 +68,111 @@ async def download_to_staging(
         "local_file_path": None,
     }
 
-    async with httpx.AsyncClient(timeout=timeout, follow_redirects=True) as client:
-        async with client.stream("POST", esb_endpoint, json=payload) as resp:
+    async with AsyncExitStack() as stack:
+        if client is None:
+            client = await stack.enter_async_context(httpx.AsyncClient(timeout=timeout, follow_redirects=True))
+        # 声明 identity 编码，保证 aiter_raw 拿到的就是文件原始字节（跳过 httpx 解码层）
+        async with client.stream(
+            "POST", _ESB_DOWNLOAD_URL, json=payload, headers=_IDENTITY_ENCODING, timeout=timeout
+        ) as resp:
             resp.raise_for_status()
-            with dst.open("wb") as f:
-                async for chunk in resp.aiter_bytes():
-                    if not chunk:
-                        continue
-                    f.write(chunk)
-                    size += len(chunk)
-                    h.update(chunk)
+            fd = os.open(dst, _STAGE_OPEN_FLAGS, 0o644)
+            try:
+                size = await _receive_to_fd(resp, fd, on_chunk)
+            finally:
+                os.close(fd)
+
+    # 落盘后一次性计算 sha256：file_digest 用 256 KiB 缓冲直接喂给 OpenSSL（可走 SHA-NI 等硬件指令），
+    # 并在线程池中执行，省掉逐块 h.update 的 Python 调用开销（文件刚写完，基本在 page cache 中）
+    sha256 = await asyncio.to_thread(_file_sha256, dst)
 
     return StagedFile(
         request_id=request_id,
         url=url,
-        local_path=str(dst),
+        local_path=dst,
         size_bytes=size,
-        sha256=h.hexdigest(),
+        sha256=sha256,
     )
 
 
+async def _receive_to_fd(
+    resp: httpx.Response,
+    fd: int,
+    on_chunk: Callable[[bytes], Awaitable[None]] | None,
+) -> int:
+    """
+    收包与落盘解耦：接收端持续读 socket 放入有界队列，写入端在线程池里按序 os.write。
+    磁盘抖动时 TCP 窗口不被卡住，对端慢发时磁盘也不空等。返回写入的字节数。
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue[bytes | None] = asyncio.Queue(maxsize=_STAGE_QUEUE_DEPTH)
+    writing: asyncio.Future | None = None
+    size = 0
+
+    async def _receive() -> None:
+        nonlocal size
+        async for chunk in resp.aiter_raw(chunk_size=_STAGE_CHUNK_SIZE):
+            if not chunk:
+                continue
+            await queue.put(chunk)
+            size += len(chunk)
+            if on_chunk is not None:
+                await on_chunk(chunk)
+        await queue.put(None)
+
+    async def _drain() -> None:
+        nonlocal writing
+        while (chunk := await queue.get()) is not None:
+            writing = loop.run_in_executor(None, _write_all, fd, chunk)
+            # shield：本协程被取消时线程里的写入仍在跑，交给外层等它结束再关 fd
+            await asyncio.shield(writing)
+
+    tasks = [asyncio.create_task(_receive()), asyncio.create_task(_drain())]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if writing is not None:
+            await asyncio.gather(writing, return_exceptions=True)
+    return size
+
+
+def _write_all(fd: int, data: bytes) -> None:
+    # os.write 可能只写入一部分，循环直到整块写完
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+def _file_sha256(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+# 同一文件 URL 在下载与上传回写时各拆一次，且多来自少数几个文件服务器目录；有界缓存防止异常调用方撑爆内存
+@lru_cache(maxsize=1024)
 def split_url_for_esb(file_url: str) -> tuple[str, str]:
+    # 带 query / fragment 的少见情况交给 urlsplit
+    if "?" in file_url or "#" in file_url:
+        return _split_url_slow(file_url)
+
+    # 常见的 scheme://host/dir/file 直接按下标切分，省去 urlsplit 的解析开销
+    scheme_end = file_url.find("://")
+    host_start = scheme_end + 3
+    if scheme_end <= 0 or file_url.find("/", host_start) == host_start or host_start == len(file_url):
+        raise ValueError(f"Invalid file url: {file_url}")
+
+    slash = file_url.rfind("/")
+    filename = file_url[slash + 1:]
+    if slash < host_start or not filename:
+        raise ValueError(f"File url missing filename: {file_url}")
+
+    return file_url[:slash], filename
+
+
+def _split_url_slow(file_url: str) -> tuple[str, str]:
     parsed = urlsplit(file_url)
     if not parsed.scheme or not parsed.netloc:
         raise ValueError(f"Invalid file url: {file_url}")
@@ -83,6 +185,31 @@ def split_url_for_esb(file_url: str) -> tuple[str, str]:
     return server_path, filename
 
 
+def _is_large_json(payload: dict) -> bool:
+    """
+    粗估结果是否大到值得放线程池序列化：页数超阈值，或顶层字符串（含字符串列表）总长超阈值。
+    只看顶层，不递归遍历，估算本身保持 O(顶层 key 数)。
+    """
+    if not isinstance(payload, dict):
+        return False
+    pages = payload.get("pages")
+    if isinstance(pages, (list, tuple)) and len(pages) > settings.JSON_OFFLOAD_MIN_PAGES:
+        return True
+
+    size = 0
+    for value in payload.values():
+        if isinstance(value, (str, bytes)):
+            size += len(value)
+        elif isinstance(value, (list, tuple)):
+            size += sum(len(v) for v in value if isinstance(v, (str, bytes)))
+    return size > settings.JSON_OFFLOAD_MIN_BYTES
+
+
+def _write_json(path: Path, payload: dict) -> None:
+    # orjson 直接产出 UTF-8 bytes（非 ASCII 原样保留），省去 str 中间态与二次编码
+    path.write_bytes(orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS))
+
+
 async def upload_json_via_esb(
     *,
     server_path: str,
@@ -90,17 +217,21 @@ async def upload_json_via_esb(
     payload: dict,
     local_file_path: str | None = None,
     timeout: float | None = 60.0,
+    client: httpx.AsyncClient | None = None,
 ) -> None:
     """
     将 JSON 内容写入本地临时文件后，通过 ESB 服务上传到文件服务器。
     说明：ESB 的 /esb-upload 接口要求容器内存在待上传文件。
+    传入 client 时复用其连接池；否则临时创建一个。
     """
-    esb_endpoint = settings.ESB_BASE_URL.rstrip("/") + "/esb-upload"
-
     # 在指定路径写入文件（需确保 ESB 容器可访问该路径，建议挂载共享卷）
     tmp_file = Path(local_file_path) if local_file_path else Path("/tmp/esb_uploads") / server_file
     tmp_file.parent.mkdir(parents=True, exist_ok=True)
-    tmp_file.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+    if _is_large_json(payload):
+        # 大结果的序列化 + 落盘会占住事件循环数毫秒，拖高并发请求的尾延迟，放到线程池
+        await asyncio.to_thread(_write_json, tmp_file, payload)
+    else:
+        _write_json(tmp_file, payload)
 
     body = {
         "server_path": server_path,
@@ -108,8 +239,10 @@ async def upload_json_via_esb(
         "local_file_path": str(tmp_file),
     }
 
-    async with httpx.AsyncClient(timeout=timeout) as client:
-        resp = await client.post(esb_endpoint, json=body)
+    async with AsyncExitStack() as stack:
+        if client is None:
+            client = await stack.enter_async_context(httpx.AsyncClient(timeout=timeout))
+        resp = await client.post(_ESB_UPLOAD_URL, json=body, timeout=timeout)
         resp.raise_for_status()
         ok = False
         try:
@@ -1,12 +1,86 @@
 from __future__ import annotations
 
-import json
-import uuid
+import time
+from secrets import token_hex
 from typing import Any
 
+import orjson
+import zstandard
+from redis.client import Pipeline
+
 from ..config import settings
 
 
+# job 结果里可能带非字符串 key 的 dict（智能体原样返回），与 json.dumps 行为保持一致
+_DUMPS_OPTS = orjson.OPT_NON_STR_KEYS
+
+# 小 job 仍存纯 JSON（与旧版本读写兼容，滚动发布/回滚期间旧实例可直接读取）；
+# 只有超过阈值的大 job 以 \x01 标记 + zstd 压缩存储，这部分旧版本无法解析
+_ZSTD_MARKER = b"\x01"
+# 压缩器非线程安全；JobTracker 只在事件循环线程上调用
+_zcomp = zstandard.ZstdCompressor(level=3)
+_zdecomp = zstandard.ZstdDecompressor()
+
+
+def _encode_job(payload: dict[str, Any]) -> bytes:
+    blob = orjson.dumps(payload, option=_DUMPS_OPTS)
+    # 大结果（长文本 OCR / base64）压缩后再写 Redis，省内存与带宽；小值压缩不划算
+    if len(blob) > settings.JOB_COMPRESS_MIN_BYTES:
+        return _ZSTD_MARKER + _zcomp.compress(blob)
+    return blob
+
+
+def _decode_job(raw: bytes) -> dict[str, Any]:
+    if raw[:1] == _ZSTD_MARKER:
+        return orjson.loads(_zdecomp.decompress(raw[1:]))
+    return orjson.loads(raw)
+
+
+_RUNNING_JOB = _encode_job({"status": "RUNNING", "result": None, "error": None})
+
+# 幂等检查 + 抢锁 + 写入 RUNNING，一次往返完成：
+#   已有 job -> {'EXISTING', job_json}；抢到锁 -> {'ACQUIRED'}；他人持锁 -> {'LOCKED'}
+#   ARGV[5] == '1' 表示 request_id 由本实例新生成，不可能已存在，跳过 GET
+_START_SCRIPT = """
+if ARGV[5] ~= '1' then
+  local j = redis.call('GET', KEYS[1])
+  if j then
+    return {'EXISTING', j}
+  end
+end
+if redis.call('SET', KEYS[2], ARGV[1], 'NX', 'EX', ARGV[2]) then
+  if tonumber(ARGV[4]) > 0 then
+    redis.call('SET', KEYS[1], ARGV[3], 'EX', ARGV[4])
+  else
+    redis.call('SET', KEYS[1], ARGV[3])
+  end
+  return {'ACQUIRED'}
+end
+return {'LOCKED'}
+"""
+
+# 写入终态并释放锁（仅当锁仍属于本 token），一次往返完成
+_COMPLETE_SCRIPT = """
+if tonumber(ARGV[2]) > 0 then
+  redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+else
+  redis.call('SET', KEYS[1], ARGV[1])
+end
+if redis.call('GET', KEYS[2]) == ARGV[3] then
+  redis.call('DEL', KEYS[2])
+end
+return 1
+"""
+
+# 仅当锁仍属于本 token 时删除：比较与删除在 Redis 内原子完成
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
 class JobTracker:
     """Manage per-request job keys, idempotency locks, and status storage in Redis."""
 
@@ -15,35 +89,116 @@ class JobTracker:
         prefix = key_prefix or settings.REDIS_KEY_PREFIX
         # Avoid double colon when caller already provides trailing ':'
         self.key_prefix = prefix.rstrip(":")
+        # 每次操作都要拼 key，按种类预先拼好前缀，调用时只做一次拼接
+        self._job_prefix = f"{self.key_prefix}:job:"
+        self._lock_prefix = f"{self.key_prefix}:lock:"
+        # register_script 只在本地算 SHA，首次调用走 EVALSHA（缺失时自动回退 EVAL）
+        self._start = self.r.register_script(_START_SCRIPT)
+        self._complete = self.r.register_script(_COMPLETE_SCRIPT)
+        self._release = self.r.register_script(_RELEASE_SCRIPT)
+        # 本进程持有的锁 {request_id: 过期时间 monotonic}：同 id 的并发重试在进程内直接判为“他人持锁”，
+        # 不必再走一次 Redis；Redis 仍是唯一权威，这里只会多拒绝、不会多放行
+        self._local_locks: dict[str, float] = {}
 
-    def _key(self, kind: str, request_id: str) -> str:
-        return f"{self.key_prefix}:{kind}:{request_id}"
+    def _held_locally(self, request_id: str) -> bool:
+        expires_at = self._local_locks.get(request_id)
+        if expires_at is None:
+            return False
+        if expires_at > time.monotonic():
+            return True
+        self._local_locks.pop(request_id, None)
+        return False
 
     def ensure_request_id(self, request_id: str | None) -> str:
-        return request_id or str(uuid.uuid4())
+        # 128 bit 随机（不少于 uuid4 的 122 bit），省去 UUID 对象构造与带连字符的格式化
+        return request_id or token_hex(16)
 
     def get_job(self, request_id: str) -> tuple[str, dict[str, Any] | None]:
-        job_key = self._key("job", request_id)
+        job_key = self._job_prefix + request_id
         raw = self.r.get(job_key)
-        return job_key, json.loads(raw) if raw else None
+        return job_key, _decode_job(raw) if raw else None
+
+    def start_job(
+        self, request_id: str, *, lock_ttl: int, job_ttl: int = 0, fresh: bool = False
+    ) -> tuple[str | None, dict[str, Any] | None]:
+        """
+        幂等检查、抢锁、写入 RUNNING 合并为一次 Redis 往返。
+        返回 (token, existing)：
+          - existing 非空：该 request_id 已有状态/结果
+          - token 非空：本实例抢到锁，job 已写为 RUNNING
+          - 两者皆空：另一个实例正持锁执行
+        fresh=True 表示 request_id 由服务端刚生成（128 bit 随机），跳过已有 job 的查询。
+        """
+        if self._held_locally(request_id):
+            return None, None
+
+        job_key = self._job_prefix + request_id
+        lock_key = self._lock_prefix + request_id
+        token = token_hex(16)
+        res = self._start(keys=[job_key, lock_key], args=[token, lock_ttl, _RUNNING_JOB, job_ttl, int(fresh)])
+        # client 不做解码，脚本返回的状态标记是 bytes
+        if res[0] == b"EXISTING":
+            return None, _decode_job(res[1])
+        if res[0] != b"ACQUIRED":
+            return None, None
+        self._local_locks[request_id] = time.monotonic() + lock_ttl
+        return token, None
 
     def acquire_lock(self, request_id: str, ttl: int) -> tuple[str | None, str]:
-        lock_key = self._key("lock", request_id)
-        token = str(uuid.uuid4())
+        lock_key = self._lock_prefix + request_id
+        if self._held_locally(request_id):
+            return None, lock_key
+        token = token_hex(16)
         got_lock = self.r.set(lock_key, token, nx=True, ex=ttl)
-        return (token if got_lock else None), lock_key
+        if not got_lock:
+            return None, lock_key
+        self._local_locks[request_id] = time.monotonic() + ttl
+        return token, lock_key
 
     def release_lock(self, request_id: str, token: str) -> None:
-        lock_key = self._key("lock", request_id)
+        lock_key = self._lock_prefix + request_id
+        self._local_locks.pop(request_id, None)
         try:
-            cur = self.r.get(lock_key)
-            if cur == token:
-                self.r.delete(lock_key)
+            self._release(keys=[lock_key], args=[token])
         except Exception:
             pass
 
-    def set_status(self, request_id: str, status: str, *, result: Any = None, error: str | None = None, ttl: int = 0) -> tuple[str, dict[str, Any]]:
-        job_key = self._key("job", request_id)
+    def pipeline(self) -> Pipeline:
+        """非事务 pipeline：多次 set_status(..., pipe=p) 后 p.execute()，合并为一次往返。"""
+        return self.r.pipeline(transaction=False)
+
+    def set_status(
+        self,
+        request_id: str,
+        status: str,
+        *,
+        result: Any = None,
+        error: str | None = None,
+        ttl: int = 0,
+        pipe: Pipeline | None = None,
+    ) -> tuple[str, dict[str, Any]]:
+        """写入 job 状态；传入 pipe 时只入队，由调用方 execute()。"""
+        job_key = self._job_prefix + request_id
+        payload = {"status": status, "result": result, "error": error}
+        (pipe if pipe is not None else self.r).set(job_key, _encode_job(payload), ex=ttl or None)
+        return job_key, payload
+
+    def complete(
+        self,
+        request_id: str,
+        token: str,
+        status: str,
+        *,
+        result: Any = None,
+        error: str | None = None,
+        ttl: int = 0,
+    ) -> tuple[str, dict[str, Any]]:
+        """写入终态（SUCCEEDED/FAILED）并释放幂等锁，合并为一次 Redis 往返。"""
+        job_key = self._job_prefix + request_id
         payload = {"status": status, "result": result, "error": error}
-        self.r.set(job_key, json.dumps(payload), ex=ttl or None)
+        self._local_locks.pop(request_id, None)
+        self._complete(
+            keys=[job_key, self._lock_prefix + request_id],
+            args=[_encode_job(payload), ttl, token],
+        )
         return job_key, payload